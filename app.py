@@ -18,8 +18,11 @@ try:
     print("NLTK data downloaded successfully")
 except Exception as e:
     print(f"Error downloading NLTK data: {str(e)}")
-from flask import Flask, request, jsonify, render_template
+import time
+from functools import wraps
+from flask import Flask, request, jsonify, render_template, g, send_from_directory
 from chatbot import ECommerceBot
+from profiler import RequestProfiler
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -37,6 +40,29 @@ except Exception as e:
     logger.error(f"Failed to initialize chatbot: {str(e)}")
     ecommerce_bot = None
 
+# Initialize the request profiler (off unless sampled or requested via header)
+request_profiler = RequestProfiler.from_env()
+
+@app.before_request
+def start_profiling():
+    """Start profiling the request if it is sampled or explicitly requested"""
+    g.profile = None
+    if request.endpoint in (None, 'static') or request.path.startswith('/api/admin/'):
+        return
+    reason = request_profiler.should_profile(request.headers)
+    if reason:
+        g.profile_forced = reason == 'forced'
+        g.profile_started_at = time.perf_counter()
+        g.profile = request_profiler.start()
+
+@app.teardown_request
+def stop_profiling(error=None):
+    """Stop profiling and keep the profile if it was forced or the request was slow"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        request_profiler.stop(profile, g.profile_started_at, request.endpoint or 'unknown',
+                              forced=g.profile_forced)
+
 @app.route('/')
 def index():
     """Render the web interface for testing the chatbot"""
@@ -85,6 +111,61 @@ def train_model():
         logger.error(f"Error in train_model endpoint: {str(e)}")
         return jsonify({"error": f"An error occurred during training: {str(e)}"}), 500
 
+def require_admin_token(view):
+    """Reject requests that do not carry the ADMIN_TOKEN secret in X-Admin-Token"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not request_profiler.check_token(request.headers.get('X-Admin-Token')):
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapped
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@require_admin_token
+def list_profiles():
+    """API endpoint to list saved slow-request profiles (for admin use)"""
+    try:
+        return jsonify({
+            "config": request_profiler.get_config(),
+            "profiles": request_profiler.list_profiles()
+        })
+    except Exception as e:
+        logger.error(f"Error in list_profiles endpoint: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+@app.route('/api/admin/profiles/<name>', methods=['GET'])
+@require_admin_token
+def download_profile(name):
+    """API endpoint to download a saved profile file (for admin use)"""
+    if not any(item['name'] == name for item in request_profiler.list_profiles()):
+        return jsonify({"error": "Profile not found"}), 404
+    return send_from_directory(os.path.abspath(request_profiler.profile_dir), name, as_attachment=True)
+
+@app.route('/api/admin/profiles/config', methods=['POST'])
+@require_admin_token
+def configure_profiler():
+    """API endpoint to change profiler settings at runtime (for admin use).
+
+    Settings are held per process: with several gunicorn workers only the
+    worker that handles this request is reconfigured, while the profile list
+    reads the directory shared by all workers.
+    """
+    try:
+        data = request.json or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Invalid profiler settings: expected a JSON object"}), 400
+        request_profiler.configure(
+            sample_rate=data.get('sample_rate'),
+            slow_ms=data.get('slow_ms'),
+            max_files=data.get('max_files')
+        )
+        return jsonify({"config": request_profiler.get_config()})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid profiler settings: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Error in configure_profiler endpoint: {str(e)}")
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -0,0 +1,240 @@
+import os
+import hmac
+import math
+import time
+import random
+import logging
+import cProfile
+import threading
+from datetime import datetime
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class RequestProfiler:
+    def __init__(self, profile_dir='profiles', sample_rate=0.0, slow_ms=500.0,
+                 max_files=20, header_name='X-Profile', admin_token=None):
+        """Initialize the request profiler with its sampling and storage settings"""
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.max_files = max_files
+        self.header_name = header_name
+        self.admin_token = admin_token
+
+        # The initial ring size is the hard upper bound for runtime changes
+        self.max_files_limit = max_files
+
+        # Only one request can hold the interpreter's profiler hook at a time
+        self._lock = threading.Lock()
+        logger.info(f"Request profiler initialized with profile directory: {profile_dir}")
+
+    @classmethod
+    def from_env(cls):
+        """Create a profiler configured from PROFILE_* environment variables.
+
+        Invalid values are logged and replaced by their defaults, so a typo in
+        these optional settings never stops the application from starting.
+        """
+        def setting(key, default, parse):
+            value = os.environ.get(key)
+            if value is None:
+                return default
+            try:
+                return parse(value)
+            except ValueError as e:
+                logger.error(f"Ignoring invalid {key}={value!r}: {str(e)}")
+                return default
+
+        return cls(
+            profile_dir=os.environ.get("PROFILE_DIR", "profiles"),
+            sample_rate=setting("PROFILE_SAMPLE_RATE", 0.0, cls._parse_sample_rate),
+            slow_ms=setting("PROFILE_SLOW_MS", 500.0, cls._parse_slow_ms),
+            max_files=setting("PROFILE_MAX_FILES", 20, cls._parse_max_files),
+            header_name=os.environ.get("PROFILE_HEADER", "X-Profile"),
+            admin_token=os.environ.get("ADMIN_TOKEN") or None
+        )
+
+    def check_token(self, token):
+        """Check a token against the admin secret; always fails when no secret is set"""
+        if not self.admin_token or not token:
+            return False
+        return hmac.compare_digest(str(token).encode('utf-8'), self.admin_token.encode('utf-8'))
+
+    @staticmethod
+    def _to_float(name, value):
+        """Convert a setting to a finite float, raising ValueError otherwise"""
+        if isinstance(value, bool):
+            raise ValueError(f"{name} must be a number")
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a number")
+        if not math.isfinite(value):
+            raise ValueError(f"{name} must be finite")
+        return value
+
+    @classmethod
+    def _parse_sample_rate(cls, value):
+        """Validate a sample rate, which must lie between 0 and 1"""
+        value = cls._to_float('sample_rate', value)
+        if value < 0.0 or value > 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        return value
+
+    @classmethod
+    def _parse_slow_ms(cls, value):
+        """Validate a slow-request threshold, which must not be negative"""
+        value = cls._to_float('slow_ms', value)
+        if value < 0.0:
+            raise ValueError("slow_ms must not be negative")
+        return value
+
+    @staticmethod
+    def _parse_max_files(value, limit=None):
+        """Validate a ring size, which must be an integer of at least 1"""
+        if isinstance(value, str):
+            try:
+                value = int(value.strip())
+            except ValueError:
+                raise ValueError("max_files must be an integer")
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError("max_files must be an integer")
+        if value < 1 or (limit is not None and value > limit):
+            if limit is None:
+                raise ValueError("max_files must be at least 1")
+            raise ValueError(f"max_files must be between 1 and {limit}")
+        return value
+
+    def configure(self, sample_rate=None, slow_ms=None, max_files=None):
+        """Update the profiler settings at runtime.
+
+        Settings are validated before any of them is applied, so a bad value
+        leaves the configuration unchanged. They only apply to this process;
+        with several gunicorn workers each worker keeps its own settings.
+        """
+        new_sample_rate = self.sample_rate
+        new_slow_ms = self.slow_ms
+        new_max_files = self.max_files
+
+        if sample_rate is not None:
+            new_sample_rate = min(max(self._to_float('sample_rate', sample_rate), 0.0), 1.0)
+        if slow_ms is not None:
+            new_slow_ms = max(self._to_float('slow_ms', slow_ms), 0.0)
+        if max_files is not None:
+            if isinstance(max_files, str):
+                raise ValueError("max_files must be an integer")
+            new_max_files = self._parse_max_files(max_files, self.max_files_limit)
+
+        self.sample_rate = new_sample_rate
+        self.slow_ms = new_slow_ms
+        max_files_changed = new_max_files != self.max_files
+        self.max_files = new_max_files
+        if max_files_changed:
+            self._prune()
+
+        logger.info(f"Profiler configured: sample_rate={self.sample_rate}, "
+                    f"slow_ms={self.slow_ms}, max_files={self.max_files}")
+
+    def get_config(self):
+        """Return the current profiler settings"""
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_ms": self.slow_ms,
+            "max_files": self.max_files,
+            "max_files_limit": self.max_files_limit,
+            "header": self.header_name
+        }
+
+    def should_profile(self, headers):
+        """Decide whether the current request should be profiled.
+
+        Returns 'forced' when the header carries the admin secret, 'sampled'
+        when the request was picked by the sample rate, and None otherwise.
+        """
+        if self.check_token(headers.get(self.header_name)):
+            return 'forced'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def start(self):
+        """Start profiling the current request, returning None if the profiler is busy"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+            return profile
+        except Exception as e:
+            self._lock.release()
+            logger.error(f"Failed to start profiler: {str(e)}")
+            return None
+
+    def stop(self, profile, started_at, label, forced=False):
+        """Stop profiling and save the profile if it was forced or the request was slow.
+
+        The elapsed time is measured while cProfile is tracing, so it includes
+        the profiler's own overhead and slow_ms is compared against that
+        inflated time rather than the request's unprofiled latency.
+        """
+        try:
+            profile.disable()
+        finally:
+            self._lock.release()
+
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        if not forced and elapsed_ms < self.slow_ms:
+            return None
+
+        try:
+            if not os.path.exists(self.profile_dir):
+                os.makedirs(self.profile_dir)
+
+            timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+            safe_label = ''.join(c if c.isalnum() else '_' for c in label)
+            filename = f"{timestamp}_{safe_label}_{int(elapsed_ms)}ms.prof"
+            profile.dump_stats(os.path.join(self.profile_dir, filename))
+            self._prune()
+
+            reason = "forced" if forced else "slow"
+            logger.info(f"Saved profile for {reason} request ({elapsed_ms:.1f} ms): {filename}")
+            return filename
+        except Exception as e:
+            logger.error(f"Failed to save profile: {str(e)}")
+            return None
+
+    def _prune(self):
+        """Remove the oldest profile files beyond the configured limit"""
+        files = self.list_profiles()
+        for item in files[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.profile_dir, item['name']))
+            except OSError as e:
+                logger.error(f"Failed to remove old profile {item['name']}: {str(e)}")
+
+    def list_profiles(self):
+        """List the saved profile files, newest first"""
+        if not os.path.isdir(self.profile_dir):
+            return []
+
+        profiles = []
+        for name in os.listdir(self.profile_dir):
+            if not name.endswith('.prof'):
+                continue
+            path = os.path.join(self.profile_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # The file may have been pruned by another worker or thread
+                continue
+            profiles.append({
+                "name": name,
+                "size": stat.st_size,
+                "created": datetime.utcfromtimestamp(stat.st_mtime).isoformat() + "Z"
+            })
+
+        # File names start with a UTC timestamp, so they sort chronologically
+        profiles.sort(key=lambda item: item['name'], reverse=True)
+        return profiles
@@ -0,0 +1,153 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from profiler import RequestProfiler
+
+class RequestProfilerTest(unittest.TestCase):
+    def setUp(self):
+        """Create a profiler writing into a temporary directory"""
+        self.profile_dir = tempfile.mkdtemp()
+        self.profiler = RequestProfiler(profile_dir=self.profile_dir, slow_ms=0,
+                                        max_files=5, admin_token='s3cret')
+
+    def tearDown(self):
+        """Remove the temporary profile directory"""
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def save_profile(self, forced=False):
+        """Profile an empty request and return the saved file name"""
+        profile = self.profiler.start()
+        filename = self.profiler.stop(profile, time.perf_counter(), 'chat', forced=forced)
+        # Profile names carry a microsecond timestamp; keep them distinct
+        time.sleep(0.001)
+        return filename
+
+    def test_configure_rejects_invalid_values_without_changes(self):
+        """A rejected update leaves every setting unchanged"""
+        before = self.profiler.get_config()
+        invalid = [
+            {'sample_rate': float('nan')},
+            {'slow_ms': float('inf')},
+            {'sample_rate': True},
+            {'sample_rate': 0.5, 'slow_ms': 'abc'},
+            {'sample_rate': 0.5, 'max_files': 1.9},
+            {'max_files': True},
+            {'max_files': '3'},
+            {'max_files': 0},
+            {'max_files': 1000000},
+        ]
+        for settings in invalid:
+            with self.subTest(settings=settings):
+                with self.assertRaises(ValueError):
+                    self.profiler.configure(**settings)
+                self.assertEqual(self.profiler.get_config(), before)
+
+    def test_configure_applies_valid_values(self):
+        """Valid settings are applied and the sample rate is clamped"""
+        self.profiler.configure(sample_rate=2, slow_ms=100, max_files=3)
+        config = self.profiler.get_config()
+        self.assertEqual(config['sample_rate'], 1.0)
+        self.assertEqual(config['slow_ms'], 100.0)
+        self.assertEqual(config['max_files'], 3)
+
+    def test_ring_keeps_newest_profiles(self):
+        """Only the newest max_files profiles are kept, listed newest first"""
+        saved = [self.save_profile() for _ in range(7)]
+        names = [item['name'] for item in self.profiler.list_profiles()]
+        self.assertEqual(names, list(reversed(saved))[:5])
+
+    def test_lowering_max_files_prunes_immediately(self):
+        """Shrinking the ring removes the oldest profiles straight away"""
+        saved = [self.save_profile() for _ in range(4)]
+        self.profiler.configure(max_files=2)
+        names = [item['name'] for item in self.profiler.list_profiles()]
+        self.assertEqual(names, list(reversed(saved))[:2])
+
+    def test_fast_sampled_request_is_discarded(self):
+        """A sampled request under the threshold does not write a profile"""
+        self.profiler.configure(slow_ms=60000)
+        self.assertIsNone(self.save_profile())
+        self.assertEqual(self.profiler.list_profiles(), [])
+
+    def test_forced_request_is_always_saved(self):
+        """A forced profile is saved even when the request was fast"""
+        self.profiler.configure(slow_ms=60000)
+        filename = self.save_profile(forced=True)
+        self.assertIsNotNone(filename)
+        self.assertEqual([item['name'] for item in self.profiler.list_profiles()], [filename])
+
+    def test_start_returns_none_while_busy(self):
+        """Only one request can be profiled at a time"""
+        profile = self.profiler.start()
+        try:
+            self.assertIsNotNone(profile)
+            self.assertIsNone(self.profiler.start())
+        finally:
+            self.profiler.stop(profile, time.perf_counter(), 'chat')
+        second = self.profiler.start()
+        self.assertIsNotNone(second)
+        self.profiler.stop(second, time.perf_counter(), 'chat')
+
+    def test_check_token_requires_configured_secret(self):
+        """Tokens never match when no admin secret is configured"""
+        profiler = RequestProfiler(profile_dir=self.profile_dir)
+        self.assertFalse(profiler.check_token(''))
+        self.assertFalse(profiler.check_token('anything'))
+        self.assertTrue(self.profiler.check_token('s3cret'))
+        self.assertFalse(self.profiler.check_token('wrong'))
+
+    def test_should_profile_header_requires_token(self):
+        """The profile header only forces profiling with the admin secret"""
+        self.assertIsNone(self.profiler.should_profile({'X-Profile': '1'}))
+        self.assertEqual(self.profiler.should_profile({'X-Profile': 's3cret'}), 'forced')
+        self.profiler.configure(sample_rate=1)
+        self.assertEqual(self.profiler.should_profile({}), 'sampled')
+
+    def test_from_env_falls_back_on_invalid_values(self):
+        """Invalid environment settings are replaced by the defaults"""
+        env = {
+            'PROFILE_SAMPLE_RATE': '10%',
+            'PROFILE_SLOW_MS': 'inf',
+            'PROFILE_MAX_FILES': '0',
+        }
+        with mock.patch.dict(os.environ, env):
+            profiler = RequestProfiler.from_env()
+        self.assertEqual(profiler.sample_rate, 0.0)
+        self.assertEqual(profiler.slow_ms, 500.0)
+        self.assertEqual(profiler.max_files, 20)
+
+    def test_from_env_rejects_out_of_range_values(self):
+        """Out-of-range environment settings are replaced by the defaults"""
+        env = {
+            'PROFILE_SAMPLE_RATE': '1.5',
+            'PROFILE_SLOW_MS': '-1',
+            'PROFILE_MAX_FILES': '-3',
+        }
+        with mock.patch.dict(os.environ, env):
+            profiler = RequestProfiler.from_env()
+        self.assertEqual(profiler.sample_rate, 0.0)
+        self.assertEqual(profiler.slow_ms, 500.0)
+        self.assertEqual(profiler.max_files, 20)
+
+    def test_from_env_reads_valid_values(self):
+        """Valid environment settings are used as given"""
+        env = {
+            'PROFILE_SAMPLE_RATE': '0.25',
+            'PROFILE_SLOW_MS': '200',
+            'PROFILE_MAX_FILES': '7',
+            'ADMIN_TOKEN': 'token',
+        }
+        with mock.patch.dict(os.environ, env):
+            profiler = RequestProfiler.from_env()
+        self.assertEqual(profiler.sample_rate, 0.25)
+        self.assertEqual(profiler.slow_ms, 200.0)
+        self.assertEqual(profiler.max_files, 7)
+        self.assertEqual(profiler.max_files_limit, 7)
+        self.assertTrue(profiler.check_token('token'))
+
+if __name__ == '__main__':
+    unittest.main()